@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+import pyarrow as pa
+import plotly.express as px
 import math
-import json
+import re
 
 # -------------------- PAGE CONFIG --------------------
 st.set_page_config(
@@ -33,52 +34,97 @@ st.sidebar.markdown("## ⚙️ Settings")
 source = st.sidebar.selectbox("Select Data Source", ["AI_SURVEY_CLEAN", "AI_SURVEY_RAW"], index=0)
 
 # -------------------- LOAD DATA --------------------
-query = f"SELECT * FROM {source}"
-df = session.sql(query).to_pandas()
-
-if source == "AI_SURVEY_RAW":
-    rename_map = {
-        "WHAT_IS_YOUR_AGE_RANGE": "AGE_RANGE",
-        "WHAT_IS_YOUR_GENDER": "GENDER",
-        "WHAT_IS_YOUR_EDUCATION_LEVEL": "EDUCATION_LEVEL",
-        "WHAT_IS_YOUR_EMPLOYMENT_STATUS": "EMPLOYMENT_STATUS",
-        "PLEASE_RATE_HOW_ACTIVELY_YOU_USE_AI_POWERED_PRODUCTS_IN_YOUR_DAILY_LIFE_ON_A_SCALE_FROM_1_TO_5": "AI_USAGE_RATING",
-        "DO_YOU_GENERALLY_TRUST_ARTIFICIAL_INTELLIGENCE_AI": "TRUST_AI",
-        "WOULD_YOU_LIKE_TO_USE_MORE_AI_PRODUCTS_IN_THE_FUTURE": "WANT_MORE_AI",
-    }
-    df = df.rename(columns={k: v for k, v in rename_map.items() if k in df.columns})
-
-df["AI_USAGE_RATING_NUM"] = pd.to_numeric(df.get("AI_USAGE_RATING"), errors="coerce")
+RAW_RENAME_MAP = {
+    "WHAT_IS_YOUR_AGE_RANGE": "AGE_RANGE",
+    "WHAT_IS_YOUR_GENDER": "GENDER",
+    "WHAT_IS_YOUR_EDUCATION_LEVEL": "EDUCATION_LEVEL",
+    "WHAT_IS_YOUR_EMPLOYMENT_STATUS": "EMPLOYMENT_STATUS",
+    "PLEASE_RATE_HOW_ACTIVELY_YOU_USE_AI_POWERED_PRODUCTS_IN_YOUR_DAILY_LIFE_ON_A_SCALE_FROM_1_TO_5": "AI_USAGE_RATING",
+    "DO_YOU_GENERALLY_TRUST_ARTIFICIAL_INTELLIGENCE_AI": "TRUST_AI",
+    "WOULD_YOU_LIKE_TO_USE_MORE_AI_PRODUCTS_IN_THE_FUTURE": "WANT_MORE_AI",
+}
+FILTER_COLS = ["AGE_RANGE", "GENDER", "EDUCATION_LEVEL", "EMPLOYMENT_STATUS"]
+FILTER_KEYS = ["age_pick", "gender_pick", "edu_pick", "emp_pick"]
+VALID_KEYWORDS_RE = re.compile(r"age|gender|education|employment|ai usage|trust|adoption", re.I)
+
+
+def where_clause(source, filters):
+    # filters are (column, value) pairs on the renamed columns; map back to the source names
+    raw_names = {v: k for k, v in RAW_RENAME_MAP.items()} if source == "AI_SURVEY_RAW" else {}
+    wheres = [f"{raw_names.get(col, col)} = ?" for col, _ in filters]
+    params = [value for _, value in filters]
+    return (" WHERE " + " AND ".join(wheres) if wheres else ""), params
+
+
+def run_query(query, params=()):
+    # fetch the result as one Arrow table; text columns stay Arrow-backed instead of becoming object
+    cur = session.connection.cursor()
+    try:
+        cur.execute(query, list(params))
+        table = cur.fetch_arrow_all(force_return_table=True)
+        return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+    finally:
+        cur.close()
+
+
+@st.cache_data(ttl=600, show_spinner="Loading from Snowflake...")
+def load_source(source, filters):
+    where, params = where_clause(source, filters)
+    return run_query(f"SELECT * FROM {source}{where}", params)
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_survey(source, filters):
+    df = load_source(source, filters)
+    if source == "AI_SURVEY_RAW":
+        df = df.rename(columns={k: v for k, v in RAW_RENAME_MAP.items() if k in df.columns})
+    if "AI_USAGE_RATING" in df.columns:
+        # ratings are whole numbers 1–5, so a nullable int8 is enough; anything else becomes <NA>
+        rating = pd.to_numeric(df["AI_USAGE_RATING"], errors="coerce").astype("float64")
+        df["AI_USAGE_RATING_NUM"] = rating.where(rating.isin(range(1, 6))).astype("Int8")
+    for c in FILTER_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    return df
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def filter_options(source):
+    df = load_survey(source, ())
+    # filter columns are categorical, so categories are already unique, sorted and null-free
+    return {c: ["(All)"] + (df[c].cat.categories.tolist() if c in df.columns else []) for c in FILTER_COLS}
+
+
+def selected_filters():
+    # the dashboard selectboxes keep their picks in session state, so both fragments can read them
+    picks = [st.session_state.get(k, "(All)") for k in FILTER_KEYS]
+    return tuple((col, pick) for col, pick in zip(FILTER_COLS, picks) if pick != "(All)")
+
 
 # -------------------- TABS --------------------
 tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "💬 AI Q&A", "ℹ️ About"])
 
+
 # ==========================================================
 # TAB 1: DASHBOARD
 # ==========================================================
-with tab1:
+@st.fragment
+def render_dashboard(source):
+    df = load_survey(source, ())
     st.markdown("### 📊 Explore the Survey Data")
 
     # Filter Panel
     with st.expander("🔎 Apply Filters", expanded=True):
-        def pick_opts(series):
-            try:
-                return ["(All)"] + sorted([x for x in series.dropna().unique().tolist()])
-            except:
-                return ["(All)"]
-
+        opts = filter_options(source)
         col1, col2, col3, col4 = st.columns(4)
-        age_pick = col1.selectbox("Age Range", pick_opts(df.get("AGE_RANGE", pd.Series(dtype='object'))))
-        gender_pick = col2.selectbox("Gender", pick_opts(df.get("GENDER", pd.Series(dtype='object'))))
-        edu_pick = col3.selectbox("Education", pick_opts(df.get("EDUCATION_LEVEL", pd.Series(dtype='object'))))
-        emp_pick = col4.selectbox("Employment", pick_opts(df.get("EMPLOYMENT_STATUS", pd.Series(dtype='object'))))
-
-    # Apply Filters
-    df_f = df.copy()
-    if age_pick != "(All)": df_f = df_f[df_f["AGE_RANGE"] == age_pick]
-    if gender_pick != "(All)": df_f = df_f[df_f["GENDER"] == gender_pick]
-    if edu_pick != "(All)": df_f = df_f[df_f["EDUCATION_LEVEL"] == edu_pick]
-    if emp_pick != "(All)": df_f = df_f[df_f["EMPLOYMENT_STATUS"] == emp_pick]
+        col1.selectbox("Age Range", opts["AGE_RANGE"], key="age_pick")
+        col2.selectbox("Gender", opts["GENDER"], key="gender_pick")
+        col3.selectbox("Education", opts["EDUCATION_LEVEL"], key="edu_pick")
+        col4.selectbox("Employment", opts["EMPLOYMENT_STATUS"], key="emp_pick")
+
+    # Apply Filters (pushed down to Snowflake)
+    filters = selected_filters()
+    df_f = load_survey(source, filters) if filters else df
 
     st.success(f"🔍 Showing **{len(df_f):,}** filtered responses")
 
@@ -99,74 +145,87 @@ with tab1:
         st.metric("Filtered Records", f"{len(df_f):,}")
         if "AI_USAGE_RATING_NUM" in df_f.columns:
             avg_rating = df_f["AI_USAGE_RATING_NUM"].mean()
-            st.metric("Avg Usage Rating", f"{avg_rating:.2f}")
+            st.metric("Avg Usage Rating", "N/A" if pd.isna(avg_rating) else f"{avg_rating:.2f}")
 
     st.divider()
 
+    # Filter combinations are AND-ed in Snowflake, so an empty result is routine
+    if df_f.empty:
+        st.info("No responses match the selected filters.")
+        return
+
     # Visualization Layout
     col1, col2 = st.columns(2)
     with col1:
         if "AGE_RANGE" in df_f.columns and "AI_USAGE_RATING_NUM" in df_f.columns:
             st.markdown("#### 📈 Average AI Usage by Age Range")
-            grp = df_f.groupby("AGE_RANGE")["AI_USAGE_RATING_NUM"].mean().sort_values()
-            fig, ax = plt.subplots()
-            grp.plot(kind="barh", ax=ax, color="skyblue")
-            ax.set_xlabel("Average Rating (1–5)")
-            st.pyplot(fig)
+            grp = df_f.groupby("AGE_RANGE", observed=True)["AI_USAGE_RATING_NUM"].mean().astype("float64").sort_values()
+            fig = px.bar(
+                x=grp.values, y=grp.index.astype(str), orientation="h",
+                labels={"x": "Average Rating (1–5)", "y": "AGE_RANGE"},
+                color_discrete_sequence=["skyblue"]
+            )
+            st.plotly_chart(fig, use_container_width=True)
 
     with col2:
         if "WANT_MORE_AI" in df_f.columns:
             st.markdown("#### 🥧 Willingness to Use AI in Future")
-            want_counts = df_f["WANT_MORE_AI"].fillna("Not Answered").value_counts()
-            fig, ax = plt.subplots()
-            ax.pie(
-                want_counts.values,
-                labels=want_counts.index,
-                autopct="%1.1f%%",
-                colors=["#4CAF50", "#FF9800", "#9E9E9E"]
+            want_counts = df_f["WANT_MORE_AI"].value_counts(dropna=False)
+            want_counts.index = want_counts.index.fillna("Not Answered")
+            fig = px.pie(
+                names=want_counts.index,
+                values=want_counts.values,
+                color_discrete_sequence=["#4CAF50", "#FF9800", "#9E9E9E"]
             )
-            ax.set_title("")
-            st.pyplot(fig)
+            fig.update_traces(textinfo="percent+label")
+            st.plotly_chart(fig, use_container_width=True)
 
     col3, col4 = st.columns(2)
     with col3:
         if "TRUST_AI" in df_f.columns:
             st.markdown("#### 🤝 Trust in AI")
-            trust_counts = df_f["TRUST_AI"].fillna("Not Answered").value_counts().sort_values()
-            fig, ax = plt.subplots()
-            trust_counts.plot(kind="barh", ax=ax, color="lightcoral")
-            ax.set_xlabel("Respondents")
-            st.pyplot(fig)
+            trust_counts = df_f["TRUST_AI"].value_counts(dropna=False)
+            trust_counts.index = trust_counts.index.fillna("Not Answered")
+            trust_counts = trust_counts.sort_values()
+            fig = px.bar(
+                x=trust_counts.values, y=trust_counts.index.astype(str), orientation="h",
+                labels={"x": "Respondents", "y": "TRUST_AI"},
+                color_discrete_sequence=["lightcoral"]
+            )
+            st.plotly_chart(fig, use_container_width=True)
 
     with col4:
         if "TRUST_AI" in df_f.columns and "AI_USAGE_RATING_NUM" in df_f.columns:
             st.markdown("#### 🔥 Trust × Usage Rating")
-            ct = pd.crosstab(df_f["TRUST_AI"], df_f["AI_USAGE_RATING_NUM"])
-            fig, ax = plt.subplots()
-            cax = ax.matshow(ct, aspect='auto', cmap="coolwarm")
-            ax.set_xticks(range(len(ct.columns)))
-            ax.set_xticklabels(ct.columns)
-            ax.set_yticks(range(len(ct.index)))
-            ax.set_yticklabels(ct.index)
-            ax.set_xlabel("Usage Rating")
-            ax.set_ylabel("Trust AI")
-            fig.colorbar(cax)
-            st.pyplot(fig)
+            ct = df_f.groupby(["TRUST_AI", "AI_USAGE_RATING_NUM"]).size().unstack(fill_value=0)
+            fig = px.imshow(
+                ct.to_numpy(),
+                x=ct.columns.astype(str), y=ct.index.astype(str),
+                labels={"x": "Usage Rating", "y": "Trust AI", "color": "Respondents"},
+                color_continuous_scale="RdBu_r", aspect="auto"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+
+with tab1:
+    render_dashboard(source)
 
 # ==========================================================
 # TAB 2: CHATBOT
 # ==========================================================
-with tab2:
-    st.markdown("### 💬 AI Chatbot with Data + Chat History")
-    st.info("Ask natural questions about the dataset. Example: *Which age group trusts AI the most?*")
+if "messages" not in st.session_state:
+    st.session_state.messages = []
+
+# Sidebar Chat Settings (fragments can't write to the sidebar)
+st.sidebar.markdown("### 🗂 Chat Settings")
+st.sidebar.button("🧹 Clear Chat", on_click=lambda: st.session_state.update({"messages": []}))
+st.sidebar.slider("History Length", 1, 25, 5, key="num_chat_messages")
 
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
 
-    # Sidebar Chat Settings
-    st.sidebar.markdown("### 🗂 Chat Settings")
-    st.sidebar.button("🧹 Clear Chat", on_click=lambda: st.session_state.update({"messages": []}))
-    st.sidebar.slider("History Length", 1, 25, 5, key="num_chat_messages")
+@st.fragment
+def render_chatbot(source):
+    st.markdown("### 💬 AI Chatbot with Data + Chat History")
+    st.info("Ask natural questions about the dataset. Example: *Which age group trusts AI the most?*")
 
     # Show Chat History
     icons = {"assistant": "🤖", "user": "👤"}
@@ -183,11 +242,11 @@ with tab2:
         with st.chat_message("assistant", avatar="🤖"):
             msg_container = st.empty()
             with st.spinner("Analyzing..."):
-                valid_keywords = ["age", "gender", "education", "employment", "ai usage", "trust", "adoption"]
-                if not any(kw in user_input.lower() for kw in valid_keywords):
+                if not VALID_KEYWORDS_RE.search(user_input):
                     answer = "⚠️ Sorry, your question seems outside the scope of the survey dataset."
                 else:
-                    context_str = df_f.head(20).to_string(index=False)
+                    df_f = load_survey(source, selected_filters())
+                    context_str = df_f.head(20).to_csv(index=False)
                     history = st.session_state.messages[-st.session_state.num_chat_messages:-1]
                     history_str = "\n".join(f"{m['role']}: {m['content']}" for m in history) or "No history."
 
@@ -205,12 +264,10 @@ Question:
 Answer:
 """.strip()
 
-                    escaped_prompt = json.dumps({"prompt": prompt})
-                    escaped_prompt_sql = escaped_prompt.replace("'", "''")
-                    sql = f"SELECT SNOWFLAKE.CORTEX.COMPLETE('claude-3-5-sonnet', '{escaped_prompt_sql}');"
+                    sql = "SELECT SNOWFLAKE.CORTEX.COMPLETE(?, ?)"
 
                     try:
-                        result = session.sql(sql).collect()
+                        result = session.sql(sql, params=["claude-3-5-sonnet", prompt]).collect()
                         answer = result[0][0]
                     except Exception as e:
                         answer = f"⚠️ Error: {e}"
@@ -219,6 +276,10 @@ Answer:
 
         st.session_state.messages.append({"role": "assistant", "content": answer})
 
+
+with tab2:
+    render_chatbot(source)
+
 # ==========================================================
 # TAB 3: ABOUT
 # ==========================================================
@@ -243,8 +304,8 @@ with tab3:
     st.markdown("""
     - Snowflake (Data Warehouse & Cortex AI)  
     - Streamlit (Interactive Dashboard)  
-    - Matplotlib / Altair (Visualizations)  
-    - Python (Pandas, JSON, Math)
+    - Plotly (Visualizations)  
+    - Python (Pandas, Math)
     """)
 
     st.markdown("#### 🎯 Objectives")